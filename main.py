@@ -1,13 +1,30 @@
+import asyncio
+import hashlib
+import logging
 import os
+import re
+from datetime import datetime, timezone
+from types import MappingProxyType
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Query
+import orjson
+from cachetools import TTLCache
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from database import db, create_document, get_documents
-from schemas import Gesture, Module, Quiz, Profile, Accessibility
+from database import db, create_document, create_documents, get_documents
+from schemas import Gesture, GesturePageOut, Module, Quiz, Profile, Accessibility
 
-app = FastAPI(title="SignifyLearn API")
+logger = logging.getLogger(__name__)
+
+# Resolved once; /test is polled continuously by health checks
+_DB_NAME = getattr(db, "name", None)
+
+app = FastAPI(title="SignifyLearn API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,31 +33,77 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+# (collection, keys, options). Catalog text is Indonesian, so the text index
+# uses no English stemming or stop words ("a").
+GESTURE_TEXT_INDEX = ("gesture", [("name", "text"), ("tags", "text")], {"default_language": "none"})
+INDEX_SPECS = [
+    GESTURE_TEXT_INDEX,
+    ("gesture", "name", {}),
+    ("gesture", "tags", {}),
+    ("gesture", [("category", 1), ("difficulty", 1)], {}),
+    ("gesture", "slug", {"unique": True}),
+    ("module", "slug", {"unique": True}),
+    ("quiz", "slug", {"unique": True}),
+    ("profile", "user_id", {"unique": True}),
+    ("accessibility", "user_id", {"unique": True}),
+]
+
+# $text queries fail without the text index; fall back to regex search until it exists
+_text_index_ready = False
+
+
+@app.on_event("startup")
+async def ensure_indexes():
+    global _text_index_ready
+    if db is None:
+        return
+    # Index creation must not keep the API from starting; /test still
+    # reports an unreachable database, and a failed unique index (e.g.
+    # duplicate user_id rows) only needs fixing in the data. Each index is
+    # attempted on its own so one failure doesn't skip the rest.
+    for spec in INDEX_SPECS:
+        collection_name, keys, options = spec
+        try:
+            await db[collection_name].create_index(keys, **options)
+        except Exception:
+            logger.exception("Could not create index %r on %s", keys, collection_name)
+        else:
+            if spec is GESTURE_TEXT_INDEX:
+                _text_index_ready = True
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "SignifyLearn Backend Running"}
 
 
+_TEST_BASE = MappingProxyType({
+    "backend": "✅ Running",
+    "database": "❌ Not Available",
+    "database_url": None,
+    "database_name": None,
+    "connection_status": "Not Connected",
+    "collections": (),
+})
+_collections_cache = TTLCache(maxsize=1, ttl=30)
+
+
 @app.get("/test")
-def test_database():
-    response = {
-        "backend": "✅ Running",
-        "database": "❌ Not Available",
-        "database_url": None,
-        "database_name": None,
-        "connection_status": "Not Connected",
-        "collections": []
-    }
+async def test_database():
+    response = dict(_TEST_BASE)
     try:
         if db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
+            response["database_name"] = _DB_NAME or "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = _collections_cache.get("names")
+                if collections is None:
+                    collections = _collections_cache["names"] = await db.list_collection_names()
                 response["collections"] = collections[:20]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -56,79 +119,188 @@ def test_database():
 from bson import ObjectId
 
 def _to_json(doc):
-    if not doc:
-        return doc
-    doc = dict(doc)
-    if "_id" in doc:
+    # pymongo hands out a fresh dict per document, so rewrite _id in place
+    if doc and "_id" in doc:
         doc["id"] = str(doc.pop("_id"))
     return doc
 
 
+def _new_document(model: BaseModel):
+    """Dump a model with the same timestamps create_document would add"""
+    now = datetime.now(timezone.utc)
+    data = model.model_dump(mode="json")
+    data["created_at"] = now
+    data["updated_at"] = now
+    return data
+
+
+# Catalog content (gestures, modules, quizzes) only changes through seeding,
+# so lookups are cached in-process, together with their ETag, and marked
+# cacheable for clients.
+CATALOG_TTL_SECONDS = 300
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_TTL_SECONDS}"
+
+_gesture_cache = TTLCache(maxsize=1024, ttl=CATALOG_TTL_SECONDS)
+_module_cache = TTLCache(maxsize=1024, ttl=CATALOG_TTL_SECONDS)
+_quiz_cache = TTLCache(maxsize=1024, ttl=CATALOG_TTL_SECONDS)
+_module_list_cache = TTLCache(maxsize=1, ttl=CATALOG_TTL_SECONDS)
+
+
+# Bumped on every clear so in-flight fills started earlier don't store stale data
+_catalog_generation = 0
+
+
+def _clear_catalog_caches():
+    global _catalog_generation
+    _catalog_generation += 1
+    for cache in (_gesture_cache, _module_cache, _quiz_cache, _module_list_cache):
+        cache.clear()
+
+
+def _etag_for(doc) -> str:
+    return '"' + hashlib.sha1(orjson.dumps(doc, option=orjson.OPT_SORT_KEYS)).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so ignore any W/ prefix
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return any(tag in ("*", etag) for tag in candidates)
+
+
+async def _get_catalog_item(
+    cache: TTLCache, collection_name: str, slug: str, not_found: str,
+    response: Response, if_none_match: Optional[str],
+):
+    if db is None:
+        raise HTTPException(status_code=404, detail="Database not available")
+    entry = cache.get(slug)
+    if entry is None:
+        generation = _catalog_generation
+        doc = await db[collection_name].find_one({"slug": slug})
+        if not doc:
+            raise HTTPException(status_code=404, detail=not_found)
+        doc = _to_json(doc)
+        entry = (doc, _etag_for(doc))
+        if generation == _catalog_generation:
+            cache[slug] = entry
+    doc, etag = entry
+    headers = {"Cache-Control": CATALOG_CACHE_CONTROL, "ETag": etag}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return doc
+
+
 # -------------------- Gesture Catalog --------------------
-@app.get("/api/gestures")
-def list_gestures(
+# Fields rendered on gesture list cards; full documents come from get_gesture
+GESTURE_CARD_FIELDS = {"name": 1, "slug": 1, "category": 1, "difficulty": 1, "thumbnail": 1, "tags": 1}
+
+
+# Documented via responses= only: stored documents are returned as-is,
+# without running response validation on every page.
+@app.get("/api/gestures", responses={200: {"model": GesturePageOut}})
+async def list_gestures(
     q: Optional[str] = Query(None, description="Search by name or tags"),
+    prefix: bool = Query(False, description="Match names or tags starting with q instead of whole words"),
     category: Optional[str] = Query(None),
     difficulty: Optional[str] = Query(None),
-    page: int = 1,
-    limit: int = 24,
+    page: int = Query(1, ge=1),
+    limit: int = Query(24, ge=1, le=100),
 ):
     if db is None:
         return {"items": [], "total": 0, "page": page, "limit": limit}
     filter_q = {}
-    if q:
-        filter_q["$or"] = [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"tags": {"$regex": q, "$options": "i"}},
-        ]
+    if q and (prefix or not _text_index_ready):
+        # escaped and anchored so user input can't alter the pattern; being
+        # case-insensitive, the regex still scans the whole name/tags index
+        # rather than a bounded range, but never the documents themselves
+        pattern = re.compile(f"^{re.escape(q)}", re.IGNORECASE)
+        filter_q["$or"] = [{"name": pattern}, {"tags": pattern}]
+    elif q:
+        filter_q["$text"] = {"$search": q}
     if category:
         filter_q["category"] = category
     if difficulty:
         filter_q["difficulty"] = difficulty
 
-    total = db["gesture"].count_documents(filter_q)
-    cursor = db["gesture"].find(filter_q).skip((page - 1) * limit).limit(limit)
-    items = [_to_json(x) for x in cursor]
+    pipeline = [
+        {"$match": filter_q},
+        {"$facet": {
+            "items": [
+                {"$skip": (page - 1) * limit},
+                {"$limit": limit},
+                {"$project": GESTURE_CARD_FIELDS},
+            ],
+            "total": [{"$count": "n"}],
+        }},
+    ]
+    result = (await db["gesture"].aggregate(pipeline).to_list(length=1))[0]
+    items = [_to_json(x) for x in result["items"]]
+    total = result["total"][0]["n"] if result["total"] else 0
     return {"items": items, "total": total, "page": page, "limit": limit}
 
 
 @app.get("/api/gestures/{slug}")
-def get_gesture(slug: str):
-    if db is None:
-        raise HTTPException(status_code=404, detail="Database not available")
-    doc = db["gesture"].find_one({"slug": slug})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Gesture not found")
-    return _to_json(doc)
+async def get_gesture(slug: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    return await _get_catalog_item(_gesture_cache, "gesture", slug, "Gesture not found", response, if_none_match)
 
 
 # -------------------- Modules --------------------
+# Fields rendered on module list cards; full documents come from get_module
+MODULE_CARD_FIELDS = {"title": 1, "slug": 1, "cover_image": 1}
+
+
+async def _stream_modules(cursor, first, generation):
+    # Encode modules one at a time so the response starts after the first
+    # document. Every encoded chunk is also kept to fill the list cache, so
+    # peak memory is still O(N) encoded modules rather than O(doc_size); that
+    # buffer is what lets later requests skip MongoDB and encoding entirely.
+    chunks = [b"["]
+    yield chunks[0]
+    if first is not None:
+        chunks.append(orjson.dumps(_to_json(first)))
+        yield chunks[-1]
+        async for doc in cursor:
+            chunks.append(b"," + orjson.dumps(_to_json(doc)))
+            yield chunks[-1]
+    chunks.append(b"]")
+    yield chunks[-1]
+    if generation == _catalog_generation:
+        _module_list_cache["all"] = b"".join(chunks)
+
+
 @app.get("/api/modules")
-def list_modules():
+async def list_modules():
     if db is None:
         return []
-    return [_to_json(x) for x in db["module"].find({})]
+    headers = {"Cache-Control": CATALOG_CACHE_CONTROL}
+    body = _module_list_cache.get("all")
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
+    generation = _catalog_generation
+    # Fetch the first document before the 200 goes out, so a connection
+    # failure still surfaces as an error response instead of a truncated body.
+    cursor = db["module"].find({}, projection=MODULE_CARD_FIELDS)
+    try:
+        first = await cursor.next()
+    except StopAsyncIteration:
+        first = None
+    return StreamingResponse(
+        _stream_modules(cursor, first, generation), media_type="application/json", headers=headers
+    )
 
 
 @app.get("/api/modules/{slug}")
-def get_module(slug: str):
-    if db is None:
-        raise HTTPException(status_code=404, detail="Database not available")
-    doc = db["module"].find_one({"slug": slug})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Module not found")
-    return _to_json(doc)
+async def get_module(slug: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    return await _get_catalog_item(_module_cache, "module", slug, "Module not found", response, if_none_match)
 
 
 # -------------------- Quizzes --------------------
 @app.get("/api/quizzes/{slug}")
-def get_quiz(slug: str):
-    if db is None:
-        raise HTTPException(status_code=404, detail="Database not available")
-    doc = db["quiz"].find_one({"slug": slug})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-    return _to_json(doc)
+async def get_quiz(slug: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    return await _get_catalog_item(_quiz_cache, "quiz", slug, "Quiz not found", response, if_none_match)
 
 
 # -------------------- Profiles --------------------
@@ -140,54 +312,68 @@ class ProfileUpdate(BaseModel):
     completed_module_slug: Optional[str] = None
 
 
+# Fields returned by get_profile; timestamps stay server-side
+PROFILE_FIELDS = {
+    "user_id": 1, "name": 1, "email": 1, "avatar_url": 1, "points": 1, "level": 1,
+    "streak_days": 1, "favorite_gesture_slugs": 1, "completed_module_slugs": 1,
+}
+
+
 @app.get("/api/profile/{user_id}")
-def get_profile(user_id: str):
+async def get_profile(user_id: str):
     if db is None:
         return {}
-    doc = db["profile"].find_one({"user_id": user_id})
-    if not doc:
-        # initialize minimal profile
-        profile = Profile(user_id=user_id, name="Pengguna", email=f"{user_id}@example.com")
-        create_document("profile", profile)
-        doc = db["profile"].find_one({"user_id": user_id})
+    # initialize minimal profile on first visit
+    profile = Profile(user_id=user_id, name="Pengguna", email=f"{user_id}@example.com")
+    doc = await db["profile"].find_one_and_update(
+        {"user_id": user_id},
+        {"$setOnInsert": _new_document(profile)},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection=PROFILE_FIELDS,
+    )
     return _to_json(doc)
 
 
 @app.post("/api/profile/{user_id}")
-def update_profile(user_id: str, payload: ProfileUpdate):
+async def update_profile(user_id: str, payload: ProfileUpdate):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    update = {"$set": {"updated_at": os.times().elapsed if hasattr(os, 'times') else None}}
+    set_fields = {"updated_at": datetime.now(timezone.utc)}
+    add_to_set = {}
+    pull = {}
 
     if payload.name is not None:
-        update["$set"]["name"] = payload.name
+        set_fields["name"] = payload.name
     if payload.avatar_url is not None:
-        update["$set"]["avatar_url"] = payload.avatar_url
-
+        set_fields["avatar_url"] = payload.avatar_url
     if payload.favorite_gesture_slug:
-        if payload.remove_favorite:
-            update.setdefault("$pull", {})["favorite_gesture_slugs"] = payload.favorite_gesture_slug
-        else:
-            update.setdefault("$addToSet", {})["favorite_gesture_slugs"] = payload.favorite_gesture_slug
-
+        target = pull if payload.remove_favorite else add_to_set
+        target["favorite_gesture_slugs"] = payload.favorite_gesture_slug
     if payload.completed_module_slug:
-        update.setdefault("$addToSet", {})["completed_module_slugs"] = payload.completed_module_slug
+        add_to_set["completed_module_slugs"] = payload.completed_module_slug
 
-    db["profile"].update_one({"user_id": user_id}, update, upsert=True)
-    doc = db["profile"].find_one({"user_id": user_id})
+    # MongoDB rejects empty operator documents, so drop the unused ones
+    update = {k: v for k, v in (("$set", set_fields), ("$addToSet", add_to_set), ("$pull", pull)) if v}
+
+    doc = await db["profile"].find_one_and_update(
+        {"user_id": user_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+    )
     return _to_json(doc)
 
 
 # -------------------- Accessibility Preferences --------------------
 @app.get("/api/accessibility/{user_id}")
-def get_accessibility(user_id: str):
+async def get_accessibility(user_id: str):
     if db is None:
         return {}
-    doc = db["accessibility"].find_one({"user_id": user_id})
-    if not doc:
-        pref = Accessibility(user_id=user_id)
-        create_document("accessibility", pref)
-        doc = db["accessibility"].find_one({"user_id": user_id})
+    pref = Accessibility(user_id=user_id)
+    doc = await db["accessibility"].find_one_and_update(
+        {"user_id": user_id},
+        {"$setOnInsert": _new_document(pref)},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
     return _to_json(doc)
 
 
@@ -198,74 +384,96 @@ class AccessibilityUpdate(BaseModel):
     reduce_motion: Optional[bool] = None
 
 
+ACCESSIBILITY_FIELDS = ("dark_mode", "high_contrast", "font_scale", "reduce_motion")
+
+
 @app.post("/api/accessibility/{user_id}")
-def update_accessibility(user_id: str, payload: AccessibilityUpdate):
+async def update_accessibility(user_id: str, payload: AccessibilityUpdate):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    update = {"$set": {}}
-    for k, v in payload.model_dump(exclude_none=True).items():
-        update["$set"][k] = v
-    db["accessibility"].update_one({"user_id": user_id}, update, upsert=True)
-    doc = db["accessibility"].find_one({"user_id": user_id})
+    set_fields = {k: getattr(payload, k) for k in ACCESSIBILITY_FIELDS if getattr(payload, k) is not None}
+    if not set_fields:
+        return await get_accessibility(user_id)
+    doc = await db["accessibility"].find_one_and_update(
+        {"user_id": user_id}, {"$set": set_fields}, upsert=True, return_document=ReturnDocument.AFTER
+    )
     return _to_json(doc)
 
 
 # -------------------- Seed Data --------------------
+# Static fixtures, validated once at import
+SEED_GESTURES: List[Gesture] = [
+    Gesture(
+        name="A", slug="letter-a", category="letters", difficulty="easy",
+        thumbnail="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=400",
+        video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
+        steps=["Kepalkan tangan", "Letakkan ibu jari di samping"],
+        examples=["A untuk 'Aku'"]
+    ),
+    Gesture(
+        name="Halo", slug="halo", category="basic", difficulty="easy",
+        thumbnail="https://images.unsplash.com/photo-1516873240891-4bf2b74d0a2a?w=400",
+        video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
+        steps=["Lambaikan tangan"], examples=["Halo, apa kabar?"]
+    ),
+    Gesture(
+        name="Terima kasih", slug="terima-kasih", category="basic", difficulty="easy",
+        thumbnail="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=400",
+        video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
+        steps=["Sentuh dagu, gerakkan ke depan"], examples=["Terima kasih atas bantuannya"]
+    ),
+]
+
+SEED_MODULES: List[Module] = [
+    Module(
+        title="Dasar Bahasa Isyarat", slug="dasar-bahasa-isyarat",
+        description="Pelajari gestur dasar untuk memulai.",
+        cover_image="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=800",
+        subtopics=["Salam", "Huruf", "Angka"],
+        gesture_slugs=["halo", "terima-kasih", "letter-a"],
+    )
+]
+
+SEED_QUIZ = Quiz(
+    title="Kuis Dasar", slug="kuis-dasar",
+    questions=[
+        {"prompt": "Gestur untuk 'Halo' adalah...", "media_url": None, "options": ["A", "Lambaian tangan", "Kepalan"], "answer_index": 1},
+        {"prompt": "Bagaimana membuat huruf A?", "media_url": None, "options": ["Kepalkan tangan" , "Luruskan jari"], "answer_index": 0},
+    ],
+    related_module_slug="dasar-bahasa-isyarat",
+)
+
+
 @app.post("/api/seed")
-def seed_data():
+async def seed_data():
     if db is None:
         return {"inserted": 0}
 
-    # Only seed if empty
-    if db["gesture"].count_documents({}) == 0:
-        sample_gestures: List[Gesture] = [
-            Gesture(
-                name="A", slug="letter-a", category="letters", difficulty="easy",
-                thumbnail="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=400",
-                video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
-                steps=["Kepalkan tangan", "Letakkan ibu jari di samping"],
-                examples=["A untuk 'Aku'"]
-            ),
-            Gesture(
-                name="Halo", slug="halo", category="basic", difficulty="easy",
-                thumbnail="https://images.unsplash.com/photo-1516873240891-4bf2b74d0a2a?w=400",
-                video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
-                steps=["Lambaikan tangan"], examples=["Halo, apa kabar?"]
-            ),
-            Gesture(
-                name="Terima kasih", slug="terima-kasih", category="basic", difficulty="easy",
-                thumbnail="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=400",
-                video_url="https://samplelib.com/lib/preview/mp4/sample-5s.mp4",
-                steps=["Sentuh dagu, gerakkan ke depan"], examples=["Terima kasih atas bantuannya"]
-            ),
-        ]
-        for g in sample_gestures:
-            create_document("gesture", g)
-
-    if db["module"].count_documents({}) == 0:
-        sample_modules: List[Module] = [
-            Module(
-                title="Dasar Bahasa Isyarat", slug="dasar-bahasa-isyarat",
-                description="Pelajari gestur dasar untuk memulai.",
-                cover_image="https://images.unsplash.com/photo-1520975916090-3105956dac38?w=800",
-                subtopics=["Salam", "Huruf", "Angka"],
-                gesture_slugs=["halo", "terima-kasih", "letter-a"],
-            )
-        ]
-        for m in sample_modules:
-            create_document("module", m)
-
-    if db["quiz"].count_documents({}) == 0:
-        quiz = Quiz(
-            title="Kuis Dasar", slug="kuis-dasar",
-            questions=[
-                {"prompt": "Gestur untuk 'Halo' adalah...", "media_url": None, "options": ["A", "Lambaian tangan", "Kepalan"], "answer_index": 1},
-                {"prompt": "Bagaimana membuat huruf A?", "media_url": None, "options": ["Kepalkan tangan" , "Luruskan jari"], "answer_index": 0},
-            ],
-            related_module_slug="dasar-bahasa-isyarat",
-        )
-        create_document("quiz", quiz)
-
+    # Only seed empty collections
+    gestures, modules, quizzes = await asyncio.gather(
+        db["gesture"].count_documents({}),
+        db["module"].count_documents({}),
+        db["quiz"].count_documents({}),
+    )
+    if gestures and modules and quizzes:
+        return {"status": "ok"}
+
+    # A concurrent seed may insert the same slugs first; the unique slug
+    # indexes turn that into duplicate-key errors, which mean "already seeded".
+    try:
+        if gestures == 0:
+            await create_documents("gesture", SEED_GESTURES)
+        if modules == 0:
+            await create_documents("module", SEED_MODULES)
+        if quizzes == 0:
+            await create_document("quiz", SEED_QUIZ)
+    except DuplicateKeyError:
+        pass
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+    _clear_catalog_caches()
     return {"status": "ok"}
 
 
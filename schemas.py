@@ -3,19 +3,22 @@ Database Schemas for SignifyLearn
 
 Each Pydantic model represents a collection in MongoDB.
 Collection name is the lowercase of the class name (e.g., Gesture -> "gesture").
+The response models at the end of this file are the exception: they are not
+collections and only describe responses in the OpenAPI docs.
 """
 from typing import List, Optional, Literal
 from pydantic import BaseModel, Field, HttpUrl
 
+GestureCategory = Literal["letters", "numbers", "basic", "emotions", "activity", "other"]
+GestureDifficulty = Literal["easy", "medium", "hard"]
+
 
 class Gesture(BaseModel):
     """Sign language gesture catalog item"""
     name: str = Field(..., description="Gesture name")
     slug: str = Field(..., description="URL-friendly identifier")
-    category: Literal["letters", "numbers", "basic", "emotions", "activity", "other"] = Field(
-        "basic", description="Category filter"
-    )
-    difficulty: Literal["easy", "medium", "hard"] = Field("easy")
+    category: GestureCategory = Field("basic", description="Category filter")
+    difficulty: GestureDifficulty = Field("easy")
     thumbnail: Optional[HttpUrl] = Field(None, description="Preview image URL")
     video_url: Optional[HttpUrl] = Field(None, description="Learning video URL")
     steps: List[str] = Field(default_factory=list, description="Step-by-step explanation")
@@ -68,3 +71,25 @@ class Accessibility(BaseModel):
     high_contrast: bool = False
     font_scale: float = Field(1.0, ge=0.85, le=1.6)
     reduce_motion: bool = False
+
+
+# -------------------- Response models (OpenAPI docs only) --------------------
+# Not collections and never instantiated; URLs are plain str since stored
+# data was validated on the way in.
+class GestureOut(BaseModel):
+    """Gesture card as returned by the catalog list"""
+    id: str
+    name: str
+    slug: str
+    category: GestureCategory = "basic"
+    difficulty: GestureDifficulty = "easy"
+    thumbnail: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+
+
+class GesturePageOut(BaseModel):
+    """One page of the gesture catalog"""
+    items: List[GestureOut]
+    total: int
+    page: int
+    limit: int